@@ -3,23 +3,48 @@ QA-Hub Backend API
 FastAPI backend for the QA-Hub test automation dashboard.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.coder import PickleCoder
+from fastapi_cache.decorator import cache
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional
 from datetime import datetime
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import orjson
 import sqlite3
 import random
 import os
+from pathlib import Path
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     init_db()
+    # One worker per connection so DB calls never queue for a thread
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=POOL_SIZE + 1))
+    FastAPICache.init(InMemoryBackend(), prefix="qahub")
+    # Per-namespace cache generations, part of every cache key; see acquire_writer
+    app.state.cache_generations = {"stats": 0, "bugs": 0, "test-cases": 0, "reports": 0}
+    app.state.writer_conn = open_conn()
+    app.state.writer_lock = asyncio.Lock()
+    # run_tests only re-runs known names; append here if an endpoint ever adds one
+    app.state.test_names = [r[0] for r in app.state.writer_conn.execute("SELECT DISTINCT name FROM tests")]
+    app.state.readers = asyncio.Queue()
+    for _ in range(POOL_SIZE):
+        app.state.readers.put_nowait(open_conn(readonly=True))
     yield
-    # Shutdown (nothing needed)
+    # Shutdown
+    while not app.state.readers.empty():
+        app.state.readers.get_nowait().close()
+    app.state.writer_conn.close()
 
 
 # Initialize FastAPI app
@@ -29,19 +54,25 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# CORS middleware
+# CORS middleware; origins come from CORS_ORIGINS (comma-separated) and
+# default to the local frontend served by start-frontend.bat
+ALLOWED_ORIGINS = [o.strip() for o in os.environ.get("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",") if o.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["content-type", "authorization"],
 )
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "qa_hub.db")
+SCHEMA_VERSION = 2  # bump when init_db changes the schema
+POOL_SIZE = 4  # read-only connections; writes go through a single writer
 
 
 # Models
@@ -106,10 +137,23 @@ class AutomationReport(BaseModel):
     created_at: Optional[str] = None
 
 
+# List serializers built once at import. List routes return ORJSONResponse
+# directly, which skips FastAPI's response_model pass; response_model is kept
+# for the OpenAPI schema.
+BUG_LIST_TA = TypeAdapter(List[BugReport])
+TEST_CASE_LIST_TA = TypeAdapter(List[TestCase])
+REPORT_LIST_TA = TypeAdapter(List[AutomationReport])
+
+
 def init_db():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
+    # Schema and seed data are already in place; skip the DDL and seed checks
+    if cursor.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return
+
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS tests (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -158,6 +202,15 @@ def init_db():
         )
     """)
 
+    # Indexes for the ORDER BY created_at DESC listings
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_tests_created_at ON tests(created_at DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_bugs_created_at ON bugs(created_at DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_cases_created_at ON test_cases(created_at DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_reports_created_at ON automation_reports(created_at DESC)")
+
+    # Schema 1 indexed tests.status, which no query uses since stats became one scan
+    cursor.execute("DROP INDEX IF EXISTS ix_tests_status")
+
     # Seed data
     cursor.execute("SELECT COUNT(*) FROM tests")
     if cursor.fetchone()[0] == 0:
@@ -186,151 +239,305 @@ def init_db():
         ]
         cursor.executemany("INSERT INTO test_cases (title, description, steps, expected_result, priority, status) VALUES (?, ?, ?, ?, ?, ?)", seed_cases)
 
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     conn.close()
 
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def open_conn(readonly=False):
+    if readonly:
+        conn = sqlite3.connect(Path(DB_PATH).as_uri() + "?mode=ro", uri=True, check_same_thread=False, cached_statements=128)
+    else:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=128)
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Serve hot pages from a 256 MiB mapping and a 128 MiB page cache
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-131072")
+    conn.execute("PRAGMA busy_timeout=5000")
     return conn
 
 
+@asynccontextmanager
+async def acquire_reader():
+    conn = await app.state.readers.get()
+    try:
+        yield conn
+    finally:
+        # End any read snapshot before the next borrower sees the connection
+        if conn.in_transaction:
+            conn.rollback()
+        app.state.readers.put_nowait(conn)
+
+
+@asynccontextmanager
+async def acquire_writer(*namespaces):
+    async with app.state.writer_lock:
+        conn = app.state.writer_conn
+        try:
+            yield conn
+        finally:
+            # Never leave a half-finished transaction on the shared writer
+            if conn.in_transaction:
+                conn.rollback()
+            # Bump the generation of every cache the write touched while still
+            # holding the lock; a read that started before the commit stores
+            # under the old key, which is never asked for again
+            for namespace in namespaces:
+                app.state.cache_generations[namespace] += 1
+
+
+# Liveness probes hit this constantly, so skip the model and encoder entirely;
+# response_model stays for the OpenAPI schema only
+_HEALTH_TEMPLATE = b'{"status":"healthy","timestamp":"%s","version":"1.0.0"}'
+
+
 @app.get("/api/health", response_model=HealthResponse)
 async def health():
-    return HealthResponse(status="healthy", timestamp=datetime.now().isoformat(), version="1.0.0")
+    return Response(content=_HEALTH_TEMPLATE % datetime.now().isoformat().encode(), media_type="application/json")
+
+
+# Blocking database work, run on the default executor via asyncio.to_thread.
+# List queries name their columns so rows can be read positionally and fed
+# to model_construct; the data comes from our own schema and needs no validation.
+def _stats_sync(conn):
+    return conn.execute("SELECT COUNT(*), COALESCE(SUM(status='passed'), 0), COALESCE(SUM(status='failed'), 0), COALESCE(AVG(duration), 0) FROM tests").fetchone()
+
+
+# Private PRNG for simulated runs; only used under the writer lock
+_rng = random.Random()
+
+
+def _run_tests_sync(conn, names):
+    # One uniform draw per test: u < 0.1 fails, and u rescaled within its
+    # branch is again uniform, giving 100-600ms passes and 3000-5000ms failures
+    rows = []
+    for name in names:
+        u = _rng.random()
+        if u >= 0.1:
+            rows.append((name, "passed", 100 + int((u - 0.1) / 0.9 * 501)))
+        else:
+            rows.append((name, "failed", 3000 + int(u / 0.1 * 2001)))
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany("INSERT INTO tests (name, status, duration) VALUES (?, ?, ?)", rows)
+    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    conn.commit()
+    # AUTOINCREMENT ids are contiguous within the IMMEDIATE transaction
+    first_id = last_id - len(rows) + 1
+    return [TestResult(id=first_id + i, name=name, status=status, duration=duration) for i, (name, status, duration) in enumerate(rows)]
+
+
+def _bugs_sync(conn):
+    return conn.execute("SELECT id, title, description, severity, status, assignee, created_at FROM bugs ORDER BY created_at DESC").fetchall()
+
+
+def _create_bug_sync(conn, bug):
+    cur = conn.execute("INSERT INTO bugs (title, description, severity, status, assignee) VALUES (?, ?, ?, ?, ?)", (bug.title, bug.description, bug.severity, bug.status, bug.assignee))
+    conn.commit()
+    return cur.lastrowid
+
+
+def _test_cases_sync(conn):
+    return conn.execute("SELECT id, title, description, steps, expected_result, priority, status, created_at FROM test_cases ORDER BY created_at DESC").fetchall()
+
+
+def _create_test_case_sync(conn, tc):
+    cur = conn.execute("INSERT INTO test_cases (title, description, steps, expected_result, priority, status) VALUES (?, ?, ?, ?, ?, ?)", (tc.title, tc.description, tc.steps, tc.expected_result, tc.priority, tc.status))
+    conn.commit()
+    return cur.lastrowid
+
+
+def _reports_sync(conn):
+    return conn.execute("SELECT id, suite_name, total_tests, passed, failed, duration, environment, created_at FROM automation_reports ORDER BY created_at DESC LIMIT 20").fetchall()
+
+
+def _create_report_sync(conn, report):
+    cur = conn.execute("INSERT INTO automation_reports (suite_name, total_tests, passed, failed, duration, environment) VALUES (?, ?, ?, ?, ?, ?)", (report.suite_name, report.total_tests, report.passed, report.failed, report.duration, report.environment))
+    conn.commit()
+    return cur.lastrowid
+
+
+def _delete_sync(conn, table, row_id):
+    cur = conn.execute(f"DELETE FROM {table} WHERE id=?", (row_id,))
+    conn.commit()
+    return cur.rowcount
+
+
+# Conditional GET support. Tags are hashed from the exact rows a response is
+# built from, so a tag can never describe a different body than it is sent with.
+def make_etag(data):
+    return '"%s"' % hashlib.blake2b(repr(data).encode(), digest_size=8).hexdigest()
+
+
+def etag_headers(tag):
+    # Clients revalidate on every request; the frontend re-reads lists right
+    # after its own writes and must not see a stale copy
+    return {"ETag": tag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request, tag):
+    return request.headers.get("if-none-match") == tag
+
+
+# Short-lived read caches for polled endpoints. Each entry is (etag, rows) so
+# a cache hit, 304 included, never touches SQLite. Rows are plain tuples so
+# they pickle cheaply. The generation argument only feeds the cache key;
+# writes bump it in acquire_writer and clear the namespace as cleanup.
+@cache(expire=5, namespace="stats", coder=PickleCoder)
+async def _cached_stats(generation):
+    async with acquire_reader() as conn:
+        row = await asyncio.to_thread(_stats_sync, conn)
+    return make_etag(row), row
+
+
+@cache(expire=2, namespace="bugs", coder=PickleCoder)
+async def _cached_bugs(generation):
+    async with acquire_reader() as conn:
+        rows = await asyncio.to_thread(_bugs_sync, conn)
+    return make_etag(rows), rows
+
+
+@cache(expire=2, namespace="test-cases", coder=PickleCoder)
+async def _cached_test_cases(generation):
+    async with acquire_reader() as conn:
+        rows = await asyncio.to_thread(_test_cases_sync, conn)
+    return make_etag(rows), rows
+
+
+@cache(expire=2, namespace="reports", coder=PickleCoder)
+async def _cached_reports(generation):
+    async with acquire_reader() as conn:
+        rows = await asyncio.to_thread(_reports_sync, conn)
+    return make_etag(rows), rows
 
 
 @app.get("/api/stats", response_model=TestStats)
-async def get_stats():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) as total FROM tests")
-    total = cur.fetchone()["total"]
-    cur.execute("SELECT COUNT(*) as p FROM tests WHERE status='passed'")
-    passed = cur.fetchone()["p"]
-    cur.execute("SELECT COUNT(*) as f FROM tests WHERE status='failed'")
-    failed = cur.fetchone()["f"]
-    cur.execute("SELECT AVG(duration) as avg FROM tests")
-    avg = cur.fetchone()["avg"] or 0
-    conn.close()
+async def get_stats(request: Request, response: Response):
+    tag, (total, passed, failed, avg) = await _cached_stats(app.state.cache_generations["stats"])
+    if not_modified(request, tag):
+        return Response(status_code=304, headers=etag_headers(tag))
+    response.headers.update(etag_headers(tag))
     return TestStats(totalTests=total, passed=passed, failed=failed, passRate=round((passed/total*100), 1) if total else 0, avgDuration=round(avg/1000, 2), coverage=85.0)
 
 
+def _tests_snapshot_sync(conn, limit):
+    # One read transaction covers both queries, so the ids behind the ETag are
+    # exactly the rows streamed. The id list is a covering scan of
+    # ix_tests_created_at; test rows are never updated, so ids pin the content.
+    conn.execute("BEGIN")
+    ids = [r[0] for r in conn.execute("SELECT id FROM tests ORDER BY created_at DESC LIMIT ?", (limit,))]
+    cur = conn.execute("SELECT id, name, status, duration, created_at FROM tests ORDER BY created_at DESC LIMIT ?", (limit,))
+    return make_etag(ids), cur
+
+
+# Streams the JSON array in fetchmany-sized chunks so large limits never hold
+# the full result set or encoded body in memory. The first item yielded is the
+# ETag; the reader and its snapshot are held until the stream is closed.
+async def _stream_tests(limit):
+    async with acquire_reader() as conn:
+        tag, cur = await asyncio.to_thread(_tests_snapshot_sync, conn, limit)
+        try:
+            yield tag
+            yield b"["
+            sep = b""
+            while rows := await asyncio.to_thread(cur.fetchmany, 500):
+                chunk = orjson.dumps([{"id": r[0], "name": r[1], "status": r[2], "duration": r[3], "created_at": r[4]} for r in rows])
+                yield sep + chunk[1:-1]
+                sep = b","
+            yield b"]"
+        finally:
+            cur.close()
+
+
 @app.get("/api/tests", response_model=List[TestResult])
-async def get_tests(limit: int = 50):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tests ORDER BY created_at DESC LIMIT ?", (limit,))
-    tests = [TestResult(id=r["id"], name=r["name"], status=r["status"], duration=r["duration"], created_at=r["created_at"]) for r in cur.fetchall()]
-    conn.close()
-    return tests
+async def get_tests(request: Request, limit: int = 50):
+    stream = _stream_tests(limit)
+    tag = await stream.__anext__()
+    if not_modified(request, tag):
+        await stream.aclose()
+        return Response(status_code=304, headers=etag_headers(tag))
+    return StreamingResponse(stream, media_type="application/json", headers=etag_headers(tag))
 
 
 @app.post("/api/tests/run", response_model=RunTestsResponse)
 async def run_tests():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT name FROM tests")
-    names = [r["name"] for r in cur.fetchall()] or ["Test 1", "Test 2", "Test 3"]
-    results = []
-    for name in names[:10]:
-        status = "passed" if random.random() > 0.1 else "failed"
-        duration = random.randint(100, 600) if status == "passed" else random.randint(3000, 5000)
-        cur.execute("INSERT INTO tests (name, status, duration) VALUES (?, ?, ?)", (name, status, duration))
-        results.append(TestResult(id=cur.lastrowid, name=name, status=status, duration=duration))
-    conn.commit()
-    conn.close()
+    async with acquire_writer("stats") as conn:
+        names = app.state.test_names[:10] or ["Test 1", "Test 2", "Test 3"]
+        results = await asyncio.to_thread(_run_tests_sync, conn, names)
+    await FastAPICache.clear(namespace="stats")
     passed = sum(1 for r in results if r.status == "passed")
     return RunTestsResponse(success=True, message=f"Executed {len(results)} tests: {passed} passed, {len(results)-passed} failed", results=results)
 
 
 @app.get("/api/bugs", response_model=List[BugReport])
-async def get_bugs():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM bugs ORDER BY created_at DESC")
-    bugs = [BugReport(id=r["id"], title=r["title"], description=r["description"], severity=r["severity"], status=r["status"], assignee=r["assignee"], created_at=r["created_at"]) for r in cur.fetchall()]
-    conn.close()
-    return bugs
+async def get_bugs(request: Request) -> Response:
+    tag, rows = await _cached_bugs(app.state.cache_generations["bugs"])
+    if not_modified(request, tag):
+        return Response(status_code=304, headers=etag_headers(tag))
+    bugs = [BugReport.model_construct(id=r[0], title=r[1], description=r[2], severity=r[3], status=r[4], assignee=r[5], created_at=r[6]) for r in rows]
+    return ORJSONResponse(content=BUG_LIST_TA.dump_python(bugs, mode="json"), headers=etag_headers(tag))
 
 
 @app.post("/api/bugs", response_model=BugReport)
 async def create_bug(bug: BugReport):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO bugs (title, description, severity, status, assignee) VALUES (?, ?, ?, ?, ?)", (bug.title, bug.description, bug.severity, bug.status, bug.assignee))
-    bug.id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    async with acquire_writer("bugs") as conn:
+        bug.id = await asyncio.to_thread(_create_bug_sync, conn, bug)
+    await FastAPICache.clear(namespace="bugs")
     return bug
 
 
 @app.delete("/api/bugs/{bug_id}")
 async def delete_bug(bug_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM bugs WHERE id=?", (bug_id,))
-    if cur.rowcount == 0:
-        conn.close()
+    async with acquire_writer("bugs") as conn:
+        deleted = await asyncio.to_thread(_delete_sync, conn, "bugs", bug_id)
+    await FastAPICache.clear(namespace="bugs")
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Bug not found")
-    conn.commit()
-    conn.close()
     return {"message": f"Bug {bug_id} deleted"}
 
 
 @app.get("/api/test-cases", response_model=List[TestCase])
-async def get_test_cases():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM test_cases ORDER BY created_at DESC")
-    cases = [TestCase(id=r["id"], title=r["title"], description=r["description"], steps=r["steps"], expected_result=r["expected_result"], priority=r["priority"], status=r["status"], created_at=r["created_at"]) for r in cur.fetchall()]
-    conn.close()
-    return cases
+async def get_test_cases(request: Request) -> Response:
+    tag, rows = await _cached_test_cases(app.state.cache_generations["test-cases"])
+    if not_modified(request, tag):
+        return Response(status_code=304, headers=etag_headers(tag))
+    cases = [TestCase.model_construct(id=r[0], title=r[1], description=r[2], steps=r[3], expected_result=r[4], priority=r[5], status=r[6], created_at=r[7]) for r in rows]
+    return ORJSONResponse(content=TEST_CASE_LIST_TA.dump_python(cases, mode="json"), headers=etag_headers(tag))
 
 
 @app.post("/api/test-cases", response_model=TestCase)
 async def create_test_case(tc: TestCase):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO test_cases (title, description, steps, expected_result, priority, status) VALUES (?, ?, ?, ?, ?, ?)", (tc.title, tc.description, tc.steps, tc.expected_result, tc.priority, tc.status))
-    tc.id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    async with acquire_writer("test-cases") as conn:
+        tc.id = await asyncio.to_thread(_create_test_case_sync, conn, tc)
+    await FastAPICache.clear(namespace="test-cases")
     return tc
 
 
 @app.delete("/api/test-cases/{case_id}")
 async def delete_test_case(case_id: int):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM test_cases WHERE id=?", (case_id,))
-    if cur.rowcount == 0:
-        conn.close()
+    async with acquire_writer("test-cases") as conn:
+        deleted = await asyncio.to_thread(_delete_sync, conn, "test_cases", case_id)
+    await FastAPICache.clear(namespace="test-cases")
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Test case not found")
-    conn.commit()
-    conn.close()
     return {"message": f"Test case {case_id} deleted"}
 
 
 @app.get("/api/reports", response_model=List[AutomationReport])
-async def get_reports():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM automation_reports ORDER BY created_at DESC LIMIT 20")
-    reports = [AutomationReport(id=r["id"], suite_name=r["suite_name"], total_tests=r["total_tests"], passed=r["passed"], failed=r["failed"], duration=r["duration"], environment=r["environment"], created_at=r["created_at"]) for r in cur.fetchall()]
-    conn.close()
-    return reports
+async def get_reports(request: Request) -> Response:
+    tag, rows = await _cached_reports(app.state.cache_generations["reports"])
+    if not_modified(request, tag):
+        return Response(status_code=304, headers=etag_headers(tag))
+    reports = [AutomationReport.model_construct(id=r[0], suite_name=r[1], total_tests=r[2], passed=r[3], failed=r[4], duration=r[5], environment=r[6], created_at=r[7]) for r in rows]
+    return ORJSONResponse(content=REPORT_LIST_TA.dump_python(reports, mode="json"), headers=etag_headers(tag))
 
 
 @app.post("/api/reports", response_model=AutomationReport)
 async def create_report(report: AutomationReport):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO automation_reports (suite_name, total_tests, passed, failed, duration, environment) VALUES (?, ?, ?, ?, ?, ?)", (report.suite_name, report.total_tests, report.passed, report.failed, report.duration, report.environment))
-    report.id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    async with acquire_writer("reports") as conn:
+        report.id = await asyncio.to_thread(_create_report_sync, conn, report)
+    await FastAPICache.clear(namespace="reports")
     return report
 
 